@@ -6,8 +6,11 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import altair as alt
+import pyarrow.csv as pacsv
+import io
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -18,6 +21,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# One timestamp per script run, shared by the export filename and the footer
+NOW = datetime.now()
+TODAY_STR = NOW.strftime('%Y%m%d')
+NOW_STR = NOW.strftime('%Y-%m-%d %H:%M:%S')
+
+# Every chart below gets a grouped frame sliced to the fields it encodes, so the
+# Vega-Lite datasets Streamlit embeds stay small and well under this row cap
 alt.data_transformers.enable('default', max_rows=50000)
 
 # Custom CSS for modern UI
@@ -56,18 +66,43 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ===== HELPER FUNCTIONS =====
-@st.cache_data
-def load_csv_safe(path):
-    p = Path(path)
-    if not p.exists():
-        return None
+# detect_columns() key -> canonical column name used throughout the dashboard
+KEY_TO_NAME = {
+    'amount': 'SalesAmount', 'qty': 'Quantity', 'department': 'Department',
+    'store_format': 'Store_Format', 'category': 'Category', 'product': 'Product',
+    'campaign': 'Campaign', 'channel': 'Channel', 'promo': 'PromoCode',
+    'gender': 'Gender', 'age': 'Age', 'nationality': 'Nationality',
+    'city': 'City', 'zone': 'Zone', 'transaction': 'Transaction',
+    'date': 'Date', 'customer_type': 'CustomerType'
+}
+
+def load_csv_safe(source):
+    # source is either a file path or the raw bytes of an uploaded CSV
+    if isinstance(source, bytes):
+        p = io.BytesIO(source)
+    else:
+        p = Path(source)
+        if not p.exists():
+            return None
+    # pyarrow parses multi-threaded; strings_can_be_null keeps empty text cells
+    # as NaN, matching pandas' own parsers, which remain as fallbacks.
+    # Low-cardinality text is dictionary-encoded by the reader and arrives as
+    # categoricals, so no per-row Python strings are built for those columns
     try:
-        return pd.read_csv(p)
+        table = pacsv.read_csv(p if isinstance(p, io.BytesIO) else str(p),
+                               convert_options=pacsv.ConvertOptions(strings_can_be_null=True,
+                                                                    auto_dict_encode=True))
+        return table.to_pandas(date_as_object=False)
     except Exception:
+        pass
+    for engine in ("c", "python"):
+        if isinstance(p, io.BytesIO):
+            p.seek(0)
         try:
-            return pd.read_csv(p, engine="python")
+            return pd.read_csv(p, engine=engine)
         except Exception:
-            return None
+            continue
+    return None
 
 def detect_columns(df):
     cols = df.columns.tolist()
@@ -99,85 +134,65 @@ def detect_columns(df):
 
 def prepare_dataframe(df, mapping):
     d = df.copy()
-    ren = {}
-    
-    for key, col in mapping.items():
-        if col and key == 'amount':
-            ren[col] = 'SalesAmount'
-        elif col and key == 'qty':
-            ren[col] = 'Quantity'
-        elif col and key == 'department':
-            ren[col] = 'Department'
-        elif col and key == 'store_format':
-            ren[col] = 'Store_Format'
-        elif col and key == 'category':
-            ren[col] = 'Category'
-        elif col and key == 'product':
-            ren[col] = 'Product'
-        elif col and key == 'campaign':
-            ren[col] = 'Campaign'
-        elif col and key == 'channel':
-            ren[col] = 'Channel'
-        elif col and key == 'promo':
-            ren[col] = 'PromoCode'
-        elif col and key == 'gender':
-            ren[col] = 'Gender'
-        elif col and key == 'age':
-            ren[col] = 'Age'
-        elif col and key == 'nationality':
-            ren[col] = 'Nationality'
-        elif col and key == 'city':
-            ren[col] = 'City'
-        elif col and key == 'zone':
-            ren[col] = 'Zone'
-        elif col and key == 'transaction':
-            ren[col] = 'Transaction'
-        elif col and key == 'date':
-            ren[col] = 'Date'
-        elif col and key == 'customer_type':
-            ren[col] = 'CustomerType'
+    ren = {col: KEY_TO_NAME[key] for key, col in mapping.items() if col and key in KEY_TO_NAME}
     
     d = d.rename(columns=ren)
     
     # Numeric columns
     if 'SalesAmount' in d.columns:
-        d['SalesAmount'] = pd.to_numeric(d['SalesAmount'], errors='coerce').fillna(0.0)
+        d['SalesAmount'] = pd.to_numeric(d['SalesAmount'], errors='coerce').fillna(0.0).astype(np.float32)
     else:
         d['SalesAmount'] = 1.0
     
     if 'Quantity' in d.columns:
-        d['Quantity'] = pd.to_numeric(d['Quantity'], errors='coerce').fillna(1)
+        q = pd.to_numeric(d['Quantity'], errors='coerce').fillna(1)
+        # Only narrow to int32 when no fractional quantities would be truncated
+        d['Quantity'] = q.astype(np.int32) if (q % 1 == 0).all() else q.astype(np.float32)
     else:
         d['Quantity'] = 1
     
     if 'Transaction' not in d.columns:
         d['Transaction'] = d.index.astype(str)
-    else:
-        d['Transaction'] = d['Transaction'].astype(str)
+    
+    # Integer codes in an internal TxnCode column so nunique/groupby hash ints,
+    # not strings; Transaction keeps the original IDs for display and export
+    codes, uniques = pd.factorize(d['Transaction'].astype(str), sort=False)
+    d['Transaction'] = pd.Categorical.from_codes(codes, uniques)
+    d['TxnCode'] = codes.astype(np.int32)
     
     # Age & Age Groups
     if 'Age' in d.columns:
-        d['Age'] = pd.to_numeric(d['Age'], errors='coerce')
+        age = pd.to_numeric(d['Age'], errors='coerce')
+        # int16 only for whole, complete ages; float32 keeps fractions and NaNs
+        d['Age'] = age.astype(np.int16) if (age % 1 == 0).all() else age.astype(np.float32)
     else:
-        d['Age'] = np.random.randint(18, 65, size=len(d))
-    
-    def age_group(age):
-        if pd.isna(age): return 'Unknown'
-        if age < 18: return '13-17'
-        elif age < 25: return '18-24'
-        elif age < 35: return '25-34'
-        elif age < 45: return '35-44'
-        elif age < 55: return '45-54'
-        elif age < 65: return '55-64'
-        else: return '65+'
-    
-    d['AgeGroup'] = d['Age'].apply(age_group)
-    
-    # Text columns
+        # Seeded so the cached frame is reproducible across cache refreshes
+        d['Age'] = np.random.default_rng(0).integers(18, 65, size=len(d), dtype=np.int16)
+    
+    # Bucket ages to integer codes in one pass and map codes to labels;
+    # missing ages take the trailing 'Unknown' code
+    age_labels = ['13-17', '18-24', '25-34', '35-44', '45-54', '55-64', '65+', 'Unknown']
+    ages = d['Age'].to_numpy(dtype='float64')
+    age_codes = np.searchsorted([18, 25, 35, 45, 55, 65], ages, side='right')
+    age_codes[np.isnan(ages)] = len(age_labels) - 1
+    d['AgeGroup'] = pd.Categorical.from_codes(age_codes, age_labels)
+    
+    # Text columns (categorical so groupbys work on integer codes)
     text_cols = ['Department','Store_Format','Category','Product','Campaign','Channel','PromoCode','Gender','Nationality','City','Zone','CustomerType']
     for c in text_cols:
-        if c in d.columns:
-            d[c] = d[c].fillna('Unknown').astype(str)
+        if c not in d.columns:
+            continue
+        s = d[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # Already dictionary-encoded on read: fill on the codes and put the
+            # categories in the same sorted order astype('category') would give
+            if s.isna().any():
+                if 'Unknown' not in s.cat.categories:
+                    s = s.cat.add_categories('Unknown')
+                s = s.fillna('Unknown')
+            d[c] = s.cat.reorder_categories(sorted(s.cat.categories))
+        else:
+            d[c] = s.fillna('Unknown').astype(str).astype('category')
     
     # Date
     if 'Date' in d.columns:
@@ -187,22 +202,242 @@ def prepare_dataframe(df, mapping):
     
     # Promo Used
     if 'PromoCode' in d.columns:
-        d['PromoUsed'] = d['PromoCode'].astype(str).str.strip().replace({'nan':'','None':''}).apply(lambda x: bool(x) and x!='')
+        promo = d['PromoCode'].astype(str).str.strip()
+        d['PromoUsed'] = ~promo.isin(['', 'nan', 'None', 'NaN'])
     else:
         d['PromoUsed'] = False
     
-    return d
+    # Sorted by date so the date filter can binary-search a contiguous block
+    return d.sort_values('Date', kind='stable').reset_index(drop=True)
 
-def get_top_items(df, column, n=10, sort_by='SalesAmount'):
-    if column not in df.columns:
-        return pd.DataFrame()
-    result = df.groupby(column).agg(
+@st.cache_resource(show_spinner=False)
+def load_dataset(source):
+    # Read + normalise once per data source instead of on every rerun. One shared,
+    # read-only frame, so filter_frame's cached views all point at the same base
+    raw = load_csv_safe(source)
+    if raw is None:
+        return None
+    return prepare_dataframe(raw, detect_columns(raw))
+
+@st.cache_data(show_spinner=False)
+def apply_filters(_df, data_key, city, store, date_range):
+    # Returns row positions so the cache holds a small index array, not a frame
+    lo, hi = 0, len(_df)
+    if date_range:
+        dates = _df['Date'].values
+        lo = np.searchsorted(dates, np.datetime64(date_range[0]), 'left')
+        hi = np.searchsorted(dates, np.datetime64(date_range[1]), 'right')
+    conds = []
+    if city != 'All':
+        conds.append(_df['City'].values[lo:hi] == city)
+    if store != 'All':
+        conds.append(_df['Store_Format'].values[lo:hi] == store)
+    if not conds:
+        return np.arange(lo, hi)
+    return lo + np.flatnonzero(np.logical_and.reduce(conds))
+
+@st.cache_data(show_spinner=False)
+def col_options(_df, data_key, col):
+    # Categories are already unique, so no scan of the rows is needed
+    return sorted([c for c in _df[col].cat.categories if c != 'Unknown'])
+
+@st.cache_data(show_spinner=False)
+def present_values(_df, data_key, city, store, date_range, col):
+    # Categories that occur in the filtered rows, in category order, found from the codes
+    s = filter_frame(_df, data_key, city, store, date_range)[col]
+    seen = np.bincount(s.cat.codes.to_numpy(), minlength=len(s.cat.categories)) > 0
+    return s.cat.categories[seen].tolist()
+
+@st.cache_data(show_spinner=False)
+def date_bounds(_df, data_key):
+    # Earliest and latest valid date in one NaT-aware pass
+    dates = _df['Date'].to_numpy()
+    valid = dates[~np.isnat(dates)]
+    if not valid.size:
+        return None, None
+    return pd.Timestamp(valid.min()).date(), pd.Timestamp(valid.max()).date()
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def filter_frame(_df, data_key, city, store, date_range):
+    # Read-only slice of the filtered rows, shared across reruns with the same
+    # selection rather than re-gathered each time; skips the gather when nothing is excluded
+    rows = apply_filters(_df, data_key, city, store, date_range)
+    if len(rows) == len(_df):
+        return _df
+    if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+        return _df.iloc[rows[0]:rows[-1] + 1]
+    return _df.iloc[rows]
+
+@st.cache_data(show_spinner=False)
+def basket_totals(_df, data_key, city, store, date_range):
+    # Per-transaction basket value, computed once per filter selection
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    return rows.groupby('TxnCode')['SalesAmount'].sum()
+
+@st.cache_data(show_spinner=False)
+def exec_summary_tops(_df, data_key, city, store, date_range):
+    # Top 5 by sales for each Executive Summary chart, built in one cached pass
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    return {
+        c: rows.groupby(c, observed=True)['SalesAmount'].sum().nlargest(5).rename('Sales').reset_index()
+        for c in ['City', 'Store_Format', 'Department', 'Campaign']
+    }
+
+@st.cache_data(show_spinner=False)
+def cross_tab(_df, data_key, city, store, date_range, keys, aggs):
+    # Multi-key aggregation of the filtered rows, cached per filter selection
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    return rows.groupby(keys, observed=True).agg(**aggs).reset_index()
+
+def column_mode(s, mask=None):
+    # Most frequent value of a categorical column, counted straight off its codes
+    codes = s.cat.codes.to_numpy()
+    if mask is not None:
+        codes = codes[mask]
+    return s.cat.categories[np.bincount(codes).argmax()]
+
+@st.cache_data(show_spinner=False)
+def persona_profile(_df, data_key, city, store, date_range):
+    # Most common age/nationality/gender and, within that persona, the preferred
+    # department and store format; the persona rows are a code mask, never a frame
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    cols = ['AgeGroup', 'Nationality', 'Gender']
+    shape = tuple(len(rows[c].cat.categories) for c in cols)
+    # Pack the three codes into one key; a single bincount gives the whole
+    # age x nationality x gender count cube, and each mode is its marginal argmax
+    key = np.ravel_multi_index([rows[c].cat.codes.to_numpy() for c in cols], shape)
+    cube = np.bincount(key, minlength=np.prod(shape)).reshape(shape)
+    top = tuple(cube.sum(axis=tuple(j for j in range(len(cols)) if j != i)).argmax() for i in range(len(cols)))
+    persona = {c: rows[c].cat.categories[t] for c, t in zip(cols, top)}
+    persona['Count'] = int(cube[top])
+    if persona['Count'] > 0:
+        mask = key == np.ravel_multi_index(top, shape)
+        persona['Department'] = column_mode(rows['Department'], mask)
+        persona['Store_Format'] = column_mode(rows['Store_Format'], mask)
+    return persona
+
+@st.cache_data(show_spinner=False)
+def dept_views(_df, data_key, city, store, date_range):
+    # Department summary sorted by sales and by revenue per unit
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    dept = rows.groupby('Department', observed=True).agg(
+        TotalSales=('SalesAmount', 'sum'),
+        Quantity=('Quantity', 'sum'),
+        Transactions=('TxnCode', 'nunique'),
+        AvgPrice=('SalesAmount', 'mean')
+    ).reset_index()
+    dept['Revenue_per_Unit'] = dept['TotalSales'] / dept['Quantity'].replace(0, 1)
+    return (dept.sort_values('TotalSales', ascending=False),
+            dept.sort_values('Revenue_per_Unit', ascending=False))
+
+@st.cache_data(show_spinner=False)
+def demographics_aggs(_df, data_key, city, store, date_range):
+    # The People Demographics aggregations are independent and pandas releases
+    # the GIL inside its groupby/value_counts kernels, so run them side by side
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    jobs = {
+        'age_dist': lambda: rows['AgeGroup'].value_counts(),
+        'gender_counts': lambda: rows['Gender'].value_counts(),
+        'gender_sales': lambda: rows.groupby('Gender', observed=True)['SalesAmount'].sum(),
+    }
+    if 'Department' in rows.columns:
+        jobs['age_dept'] = lambda: rows.groupby(['AgeGroup', 'Department'], observed=True).agg(
+            TotalSales=('SalesAmount', 'sum'),
+            Quantity=('Quantity', 'sum')
+        ).reset_index()
+    if 'Nationality' in rows.columns:
+        jobs['nation_counts'] = lambda: rows['Nationality'].value_counts()
+        jobs['nation_dept'] = lambda: rows.groupby(['Nationality', 'Department'], observed=True).agg(
+            TotalSales=('SalesAmount', 'sum')
+        ).reset_index()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = {name: pool.submit(job) for name, job in jobs.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+@st.cache_data(show_spinner=False)
+def loyalty_profiles(_df, data_key, city, store, date_range, n=10):
+    # Top-n age/nationality/gender segments by purchase count; groups are left
+    # unsorted since nlargest picks the top n without a full sort
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    return rows.groupby(['AgeGroup', 'Nationality', 'Gender'], sort=False, observed=True).agg(
+        RepeatPurchases=('Transaction', 'count'),
+        TotalSpent=('SalesAmount', 'sum'),
+        AvgTransactionValue=('SalesAmount', 'mean')
+    ).nlargest(n, 'RepeatPurchases').reset_index()
+
+@st.cache_data(show_spinner=False)
+def strategic_sums(_df, data_key, city, store, date_range):
+    # Everything the Strategic Recommendations page ranks, from one filter pass
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    sums = {c: rows.groupby(c, sort=False, observed=True)['SalesAmount'].sum()
+            for c in ['City', 'Department', 'Campaign', 'Store_Format']}
+    modes = {c: column_mode(rows[c]) for c in ['AgeGroup', 'Nationality']}
+    return sums, modes
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def export_csv(_df, data_key, city, store, date_range):
+    # Serialise the filtered rows in chunks straight into a byte buffer rather
+    # than building the whole CSV as one Python string first
+    buf = io.BytesIO()
+    rows = filter_frame(_df, data_key, city, store, date_range)
+    # TxnCode is internal; export only the dataset's own columns
+    rows.drop(columns='TxnCode').to_csv(buf, index=False, chunksize=100_000)
+    return buf.getvalue()
+
+def gender_bar(data, y):
+    # Gender bar chart over already-aggregated data (cached in demographics_aggs),
+    # so building it per run is cheap and no Chart object is shared across sessions
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X('Gender:N'),
+        y=f'{y}:Q',
+        color='Gender:N'
+    ).properties(height=300)
+
+@st.cache_data(show_spinner=False)
+def summary_frame(values):
+    # Strategic summary table; only the Value column depends on the filters
+    return pd.DataFrame({
+        'Metric': [
+            'Best Performing City',
+            'Underperforming City',
+            'Best Department',
+            'Underperforming Department',
+            'Best Campaign',
+            'Primary Age Group',
+            'Top Nationality',
+            'Best Store Format',
+            'Total Sales',
+            'Total Transactions'
+        ],
+        'Value': list(values),
+        'Action': [
+            'Maintain & Expand',
+            'Review Strategy',
+            'Scale Investment',
+            'Revamp Marketing',
+            'Increase Budget',
+            'Target Campaigns',
+            'Create Focused Offers',
+            'Optimize Format',
+            'Monitor ROI',
+            'Track Conversion'
+        ]
+    })
+
+def summarize_by(df, column):
+    return df.groupby(column, observed=True).agg(
         TotalSales=('SalesAmount', 'sum'),
         Quantity=('Quantity', 'sum'),
-        Transactions=('Transaction', 'nunique'),
+        Transactions=('TxnCode', 'nunique'),
         AvgBasket=('SalesAmount', 'mean')
-    ).reset_index().sort_values(sort_by, ascending=False).head(n)
-    return result
+    )
+
+def get_top_and_bottom_items(df, column, n=3, sort_by='TotalSales'):
+    # One aggregation serves both the best and the worst n groups
+    if column not in df.columns:
+        return pd.DataFrame(), pd.DataFrame()
+    summary = summarize_by(df, column)
+    return summary.nlargest(n, sort_by).reset_index(), summary.nsmallest(n, sort_by).reset_index()
 
 def calculate_percentage_change(current, previous):
     if previous == 0:
@@ -211,49 +446,44 @@ def calculate_percentage_change(current, previous):
 
 # ===== LOAD DATA =====
 DEFAULT_PATH = "/mnt/data/lulu_uae_master_2000.csv"
-raw = load_csv_safe(DEFAULT_PATH)
+source, data_key = DEFAULT_PATH, DEFAULT_PATH
 
 st.sidebar.header("🔧 Data Management")
 use_upload = st.sidebar.checkbox("📤 Upload Custom CSV", value=False)
 if use_upload:
     uploaded = st.sidebar.file_uploader("Upload CSV File", type=["csv"])
     if uploaded is not None:
-        raw = pd.read_csv(uploaded)
+        source, data_key = uploaded.getvalue(), uploaded.file_id
 
-if raw is None:
+df = load_dataset(source)
+
+if df is None:
     st.error("❌ Could not load data. Please upload a CSV file.")
     st.stop()
 
-mapping = detect_columns(raw)
-df = prepare_dataframe(raw, mapping)
+cities_opts = col_options(df, data_key, 'City')
+stores_opts = col_options(df, data_key, 'Store_Format')
+camp_opts = col_options(df, data_key, 'Campaign')
 
 # ===== GLOBAL FILTERS =====
 st.sidebar.header("🎯 Global Filters")
 
-cities = ['All'] + sorted([c for c in df['City'].unique() if c != 'Unknown'])
+cities = ['All'] + cities_opts
 selected_city = st.sidebar.selectbox("🏙️ City", cities)
 
-stores = ['All'] + sorted([s for s in df['Store_Format'].unique() if s != 'Unknown'])
+stores = ['All'] + stores_opts
 selected_store = st.sidebar.selectbox("🏬 Store Format", stores)
 
-if 'Date' in df.columns and df['Date'].notna().any():
-    min_d = df['Date'].min().date()
-    max_d = df['Date'].max().date()
+min_d, max_d = date_bounds(df, data_key)
+if min_d is not None:
     date_range = st.sidebar.date_input("📅 Date Range", value=(min_d, max_d), min_value=min_d, max_value=max_d)
 else:
     date_range = None
 
 # Apply Filters
-mask = pd.Series(True, index=df.index)
-if selected_city != 'All':
-    mask &= (df['City'] == selected_city)
-if selected_store != 'All':
-    mask &= (df['Store_Format'] == selected_store)
-if date_range:
-    start, end = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-    mask &= (df['Date'] >= start) & (df['Date'] <= end)
-
-filtered = df[mask].copy()
+filter_args = (data_key, selected_city, selected_store, date_range)
+filtered = filter_frame(df, *filter_args)
+baskets = basket_totals(df, *filter_args)
 
 # ===== NAVIGATION =====
 st.sidebar.header("📑 Navigation")
@@ -273,8 +503,8 @@ if page == "📊 Executive Summary":
     
     col1, col2, col3, col4 = st.columns(4)
     total_sales = filtered['SalesAmount'].sum()
-    total_tx = filtered['Transaction'].nunique()
-    avg_basket = filtered.groupby('Transaction')['SalesAmount'].sum().mean() if total_tx > 0 else 0
+    total_tx = len(baskets)
+    avg_basket = baskets.mean() if total_tx > 0 else 0
     total_qty = filtered['Quantity'].sum()
     
     col1.metric("💰 Total Sales", f"AED {total_sales:,.0f}")
@@ -284,14 +514,13 @@ if page == "📊 Executive Summary":
     
     st.divider()
     
+    tops = exec_summary_tops(df, *filter_args)
+    
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("🏆 Top 5 Cities by Sales")
-        city_data = filtered.groupby('City').agg(
-            Sales=('SalesAmount', 'sum'),
-            Transactions=('Transaction', 'nunique')
-        ).reset_index().sort_values('Sales', ascending=False).head(5)
+        city_data = tops['City']
         
         chart = alt.Chart(city_data).mark_bar().encode(
             x=alt.X('City:N', sort='-y'),
@@ -302,9 +531,7 @@ if page == "📊 Executive Summary":
     
     with col2:
         st.subheader("🏬 Top 5 Store Formats")
-        store_data = filtered.groupby('Store_Format').agg(
-            Sales=('SalesAmount', 'sum')
-        ).reset_index().sort_values('Sales', ascending=False).head(5)
+        store_data = tops['Store_Format']
         
         chart = alt.Chart(store_data).mark_bar().encode(
             x=alt.X('Store_Format:N', sort='-y'),
@@ -319,9 +546,7 @@ if page == "📊 Executive Summary":
     
     with col1:
         st.subheader("📂 Top 5 Departments")
-        dept_data = filtered.groupby('Department').agg(
-            Sales=('SalesAmount', 'sum')
-        ).reset_index().sort_values('Sales', ascending=False).head(5)
+        dept_data = tops['Department']
         
         chart = alt.Chart(dept_data).mark_bar().encode(
             x=alt.X('Department:N', sort='-y'),
@@ -332,9 +557,7 @@ if page == "📊 Executive Summary":
     
     with col2:
         st.subheader("📢 Top 5 Campaigns")
-        camp_data = filtered.groupby('Campaign').agg(
-            Sales=('SalesAmount', 'sum')
-        ).reset_index().sort_values('Sales', ascending=False).head(5)
+        camp_data = tops['Campaign']
         
         chart = alt.Chart(camp_data).mark_bar().encode(
             x=alt.X('Campaign:N', sort='-y'),
@@ -348,8 +571,9 @@ elif page == "🏙️ City Analysis":
     st.title("🏙️ City-wise Performance Analysis")
     
     # Select City for Analysis
-    analysis_city = st.selectbox("Select City for Deep Analysis", sorted([c for c in df['City'].unique() if c != 'Unknown']))
-    city_data = df[df['City'] == analysis_city]
+    analysis_city = st.selectbox("Select City for Deep Analysis", cities_opts)
+    city_data = filter_frame(df, data_key, analysis_city, 'All', None)
+    city_baskets = basket_totals(df, data_key, analysis_city, 'All', None)
     
     if len(city_data) == 0:
         st.warning("No data for selected city")
@@ -358,30 +582,31 @@ elif page == "🏙️ City Analysis":
     st.subheader(f"📊 {analysis_city} - Key Metrics")
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("💰 Total Sales", f"AED {city_data['SalesAmount'].sum():,.0f}")
-    col2.metric("🛒 Transactions", f"{city_data['Transaction'].nunique():,}")
+    col2.metric("🛒 Transactions", f"{len(city_baskets):,}")
     col3.metric("👥 Customers", f"{len(city_data):,}")
-    col4.metric("📦 Avg Basket", f"AED {city_data.groupby('Transaction')['SalesAmount'].sum().mean():,.2f}")
+    col4.metric("📦 Avg Basket", f"AED {city_baskets.mean():,.2f}")
     
     st.divider()
     
     # TOP PERFORMERS
     st.subheader("✅ Top Performers in " + analysis_city)
     
+    top_dept, low_dept = get_top_and_bottom_items(city_data, 'Department', n=3)
+    top_cat, low_cat = get_top_and_bottom_items(city_data, 'Category', n=3)
+    top_camp, low_camp = get_top_and_bottom_items(city_data, 'Campaign', n=3)
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
         st.write("**Top Department**")
-        top_dept = get_top_items(city_data, 'Department', n=3)
         st.dataframe(top_dept, use_container_width=True)
     
     with col2:
         st.write("**Top Category**")
-        top_cat = get_top_items(city_data, 'Category', n=3)
         st.dataframe(top_cat, use_container_width=True)
     
     with col3:
         st.write("**Top Campaign**")
-        top_camp = get_top_items(city_data, 'Campaign', n=3)
         st.dataframe(top_camp, use_container_width=True)
     
     st.divider()
@@ -393,17 +618,14 @@ elif page == "🏙️ City Analysis":
     
     with col1:
         st.write("**Low Selling Department**")
-        low_dept = get_top_items(city_data, 'Department', n=3).sort_values('TotalSales', ascending=True)
         st.dataframe(low_dept[['Department', 'TotalSales', 'Quantity']], use_container_width=True)
     
     with col2:
         st.write("**Low Selling Category**")
-        low_cat = get_top_items(city_data, 'Category', n=3).sort_values('TotalSales', ascending=True)
         st.dataframe(low_cat[['Category', 'TotalSales', 'Quantity']], use_container_width=True)
     
     with col3:
         st.write("**Underperforming Campaign**")
-        low_camp = get_top_items(city_data, 'Campaign', n=3).sort_values('TotalSales', ascending=True)
         st.dataframe(low_camp[['Campaign', 'TotalSales', 'Quantity']], use_container_width=True)
     
     st.divider()
@@ -454,17 +676,9 @@ elif page == "🏢 Department Analysis":
     # Overall Department Metrics
     st.subheader("📊 Department Performance Overview")
     
-    dept_analysis = filtered.groupby('Department').agg(
-        TotalSales=('SalesAmount', 'sum'),
-        Quantity=('Quantity', 'sum'),
-        Transactions=('Transaction', 'nunique'),
-        AvgPrice=('SalesAmount', 'mean')
-    ).reset_index()
-    
-    dept_analysis['Revenue_per_Unit'] = dept_analysis['TotalSales'] / dept_analysis['Quantity'].replace(0, 1)
-    dept_analysis = dept_analysis.sort_values('TotalSales', ascending=False)
+    dept_analysis, high_revenue_low_qty = dept_views(df, *filter_args)
     
-    chart = alt.Chart(dept_analysis).mark_bar().encode(
+    chart = alt.Chart(dept_analysis[['Department', 'TotalSales']]).mark_bar().encode(
         x=alt.X('Department:N', sort='-y'),
         y='TotalSales:Q',
         color='TotalSales:Q'
@@ -476,7 +690,6 @@ elif page == "🏢 Department Analysis":
     # HIGH VS LOW QUANTITY SOLD WITH HIGH REVENUE
     st.subheader("💎 High Revenue Per Unit (Low Qty, High Revenue)")
     
-    high_revenue_low_qty = dept_analysis.sort_values('Revenue_per_Unit', ascending=False)
     st.dataframe(high_revenue_low_qty[['Department', 'TotalSales', 'Quantity', 'Revenue_per_Unit']], use_container_width=True)
     
     st.markdown(f"""
@@ -493,10 +706,10 @@ elif page == "🏢 Department Analysis":
     # DEPARTMENT × CITY ANALYSIS
     st.subheader("🏙️ Department Performance by City")
     
-    dept_city = filtered.groupby(['City', 'Department']).agg(
+    dept_city = cross_tab(df, *filter_args, ['City', 'Department'], dict(
         TotalSales=('SalesAmount', 'sum'),
-        Transactions=('Transaction', 'nunique')
-    ).reset_index().sort_values('TotalSales', ascending=False)
+        Transactions=('TxnCode', 'nunique')
+    )).sort_values('TotalSales', ascending=False)
     
     st.dataframe(dept_city.head(20), use_container_width=True)
     
@@ -505,11 +718,11 @@ elif page == "🏢 Department Analysis":
     # DEPARTMENT × CAMPAIGN ANALYSIS
     st.subheader("📢 Which Campaign Works Best for Each Department?")
     
-    dept_campaign = filtered.groupby(['Department', 'Campaign']).agg(
+    dept_campaign = cross_tab(df, *filter_args, ['Department', 'Campaign'], dict(
         TotalSales=('SalesAmount', 'sum'),
         PromoRate=('PromoUsed', 'mean'),
-        Transactions=('Transaction', 'nunique')
-    ).reset_index().sort_values('TotalSales', ascending=False)
+        Transactions=('TxnCode', 'nunique')
+    )).sort_values('TotalSales', ascending=False)
     
     st.dataframe(dept_campaign.head(15), use_container_width=True)
     
@@ -536,7 +749,7 @@ elif page == "🏢 Department Analysis":
     st.subheader("❓ Department Strategy Questions")
     
     q1 = st.selectbox("Which underperforming department should we focus on?", list(dept_analysis['Department'].unique()))
-    q2 = st.selectbox("Which campaign should we test for this department?", list(filtered['Campaign'].unique()))
+    q2 = st.selectbox("Which campaign should we test for this department?", camp_opts)
     q3 = st.slider("Expected sales increase %", 0, 100, 20)
     
     if st.button("💾 Save Department Strategy"):
@@ -549,19 +762,19 @@ elif page == "📢 Campaign & Channels":
     # HIGH vs LOW PERFORMANCE
     st.subheader("📊 Campaign Performance Ranking")
     
-    campaign_perf = filtered.groupby('Campaign').agg(
+    campaign_perf = filtered.groupby('Campaign', observed=True).agg(
         TotalSales=('SalesAmount', 'sum'),
         Quantity=('Quantity', 'sum'),
-        Transactions=('Transaction', 'nunique'),
+        Transactions=('TxnCode', 'nunique'),
         AvgBasket=('SalesAmount', 'mean'),
         PromoRate=('PromoUsed', 'mean')
     ).reset_index().sort_values('TotalSales', ascending=False)
     
     # Add Performance Rating
-    campaign_perf['Performance'] = campaign_perf.apply(
-        lambda x: '⭐⭐⭐ Excellent' if x['TotalSales'] > campaign_perf['TotalSales'].quantile(0.75) 
-        else ('⭐⭐ Good' if x['TotalSales'] > campaign_perf['TotalSales'].quantile(0.25) 
-        else '⭐ Poor'), axis=1
+    q25, q75 = campaign_perf['TotalSales'].quantile([0.25, 0.75])
+    campaign_perf['Performance'] = np.where(
+        campaign_perf['TotalSales'] > q75, '⭐⭐⭐ Excellent',
+        np.where(campaign_perf['TotalSales'] > q25, '⭐⭐ Good', '⭐ Poor')
     )
     
     st.dataframe(campaign_perf, use_container_width=True)
@@ -571,12 +784,12 @@ elif page == "📢 Campaign & Channels":
     # CAMPAIGN BY DEPARTMENT
     st.subheader("🎯 Campaign Effectiveness by Department")
     
-    camp_dept = filtered.groupby(['Campaign', 'Department']).agg(
+    camp_dept = cross_tab(df, *filter_args, ['Campaign', 'Department'], dict(
         TotalSales=('SalesAmount', 'sum'),
-        Transactions=('Transaction', 'nunique')
-    ).reset_index().sort_values('TotalSales', ascending=False).head(20)
+        Transactions=('TxnCode', 'nunique')
+    )).sort_values('TotalSales', ascending=False).head(20)
     
-    chart = alt.Chart(camp_dept).mark_bar().encode(
+    chart = alt.Chart(camp_dept[['Campaign', 'Department', 'TotalSales']]).mark_bar().encode(
         x=alt.X('Campaign:N'),
         y='TotalSales:Q',
         color='Department:N'
@@ -588,10 +801,10 @@ elif page == "📢 Campaign & Channels":
     # CAMPAIGN BY CITY
     st.subheader("🏙️ Campaign Performance by City")
     
-    camp_city = filtered.groupby(['City', 'Campaign']).agg(
+    camp_city = cross_tab(df, *filter_args, ['City', 'Campaign'], dict(
         TotalSales=('SalesAmount', 'sum'),
-        Transactions=('Transaction', 'nunique')
-    ).reset_index().sort_values('TotalSales', ascending=False)
+        Transactions=('TxnCode', 'nunique')
+    )).sort_values('TotalSales', ascending=False)
     
     st.dataframe(camp_city.head(20), use_container_width=True)
     
@@ -600,12 +813,12 @@ elif page == "📢 Campaign & Channels":
     # CAMPAIGN BY AGE GROUP
     st.subheader("👥 Campaign Performance by Age Group")
     
-    camp_age = filtered.groupby(['Campaign', 'AgeGroup']).agg(
+    camp_age = cross_tab(df, *filter_args, ['Campaign', 'AgeGroup'], dict(
         TotalSales=('SalesAmount', 'sum'),
-        Transactions=('Transaction', 'nunique')
-    ).reset_index()
+        Transactions=('TxnCode', 'nunique')
+    ))
     
-    heatmap = alt.Chart(camp_age).mark_rect().encode(
+    heatmap = alt.Chart(camp_age[['Campaign', 'AgeGroup', 'TotalSales']]).mark_rect().encode(
         x=alt.X('Campaign:N'),
         y=alt.Y('AgeGroup:N'),
         color='TotalSales:Q'
@@ -635,7 +848,7 @@ elif page == "📢 Campaign & Channels":
     # QUESTIONNAIRE
     st.subheader("❓ Campaign Strategy Questions")
     
-    q1 = st.selectbox("Which campaign is your priority?", list(filtered['Campaign'].unique()))
+    q1 = st.selectbox("Which campaign is your priority?", camp_opts)
     q2 = st.slider("Budget allocation %", 0, 100, 30)
     q3 = st.selectbox("Target age group?", sorted(filtered['AgeGroup'].unique()))
     
@@ -648,14 +861,14 @@ elif page == "🏪 Store Format Analysis":
     
     st.subheader("📊 Store Format Overview")
     
-    store_perf = filtered.groupby('Store_Format').agg(
+    store_perf = filtered.groupby('Store_Format', observed=True).agg(
         TotalSales=('SalesAmount', 'sum'),
         Quantity=('Quantity', 'sum'),
-        Transactions=('Transaction', 'nunique'),
+        Transactions=('TxnCode', 'nunique'),
         AvgBasket=('SalesAmount', 'mean')
     ).reset_index().sort_values('TotalSales', ascending=False)
     
-    chart = alt.Chart(store_perf).mark_bar().encode(
+    chart = alt.Chart(store_perf[['Store_Format', 'TotalSales']]).mark_bar().encode(
         x=alt.X('Store_Format:N', sort='-y'),
         y='TotalSales:Q',
         color='TotalSales:Q'
@@ -667,10 +880,10 @@ elif page == "🏪 Store Format Analysis":
     # STORE × CITY
     st.subheader("🏙️ Store Format Performance by City")
     
-    store_city = filtered.groupby(['City', 'Store_Format']).agg(
+    store_city = cross_tab(df, *filter_args, ['City', 'Store_Format'], dict(
         TotalSales=('SalesAmount', 'sum'),
-        Transactions=('Transaction', 'nunique')
-    ).reset_index().sort_values('TotalSales', ascending=False)
+        Transactions=('TxnCode', 'nunique')
+    )).sort_values('TotalSales', ascending=False)
     
     st.dataframe(store_city.head(20), use_container_width=True)
     
@@ -682,9 +895,10 @@ elif page == "🏪 Store Format Analysis":
     col1, col2 = st.columns(2)
     
     stores = filtered['Store_Format'].unique()
+    # One store x department pass; each store's departments are then a slice of it
+    store_dept = filtered.groupby(['Store_Format', 'Department'], observed=True)['SalesAmount'].sum()
     for idx, store in enumerate(stores[:2]):
-        store_data = filtered[filtered['Store_Format'] == store]
-        dept_sales = store_data.groupby('Department')['SalesAmount'].sum().sort_values(ascending=False)
+        dept_sales = store_dept.loc[store].sort_values(ascending=False)
         
         if idx == 0:
             with col1:
@@ -706,12 +920,12 @@ elif page == "🏪 Store Format Analysis":
     # STORE × AGE GROUP
     st.subheader("👥 Customer Personas by Store Format")
     
-    store_age = filtered.groupby(['Store_Format', 'AgeGroup']).agg(
+    store_age = cross_tab(df, *filter_args, ['Store_Format', 'AgeGroup'], dict(
         TotalSales=('SalesAmount', 'sum'),
-        Transactions=('Transaction', 'nunique')
-    ).reset_index()
+        Transactions=('TxnCode', 'nunique')
+    ))
     
-    heatmap = alt.Chart(store_age).mark_rect().encode(
+    heatmap = alt.Chart(store_age[['Store_Format', 'AgeGroup', 'TotalSales']]).mark_rect().encode(
         x=alt.X('Store_Format:N'),
         y=alt.Y('AgeGroup:N'),
         color='TotalSales:Q'
@@ -723,10 +937,10 @@ elif page == "🏪 Store Format Analysis":
     # STORE × CAMPAIGN
     st.subheader("📢 Campaign Success by Store Format")
     
-    store_camp = filtered.groupby(['Store_Format', 'Campaign']).agg(
+    store_camp = cross_tab(df, *filter_args, ['Store_Format', 'Campaign'], dict(
         TotalSales=('SalesAmount', 'sum'),
         PromoRate=('PromoUsed', 'mean')
-    ).reset_index().sort_values('TotalSales', ascending=False).head(15)
+    )).sort_values('TotalSales', ascending=False).head(15)
     
     st.dataframe(store_camp, use_container_width=True)
     
@@ -753,8 +967,8 @@ elif page == "🏪 Store Format Analysis":
     # QUESTIONNAIRE
     st.subheader("❓ Store Format Optimization Questions")
     
-    q1 = st.selectbox("Which store format needs improvement?", list(filtered['Store_Format'].unique()))
-    q2 = st.selectbox("Which successful campaign to test?", list(filtered['Campaign'].unique()))
+    q1 = st.selectbox("Which store format needs improvement?", stores_opts)
+    q2 = st.selectbox("Which successful campaign to test?", camp_opts)
     q3 = st.multiselect("Select target departments", list(filtered['Department'].unique()))
     
     if st.button("💾 Save Store Format Plan"):
@@ -764,13 +978,16 @@ elif page == "🏪 Store Format Analysis":
 elif page == "👥 People Demographics":
     st.title("👥 Customer Demographics Analysis")
     
+    demo = demographics_aggs(df, *filter_args)
+    
     # AGE GROUP ANALYSIS
     st.subheader("📊 Customer Distribution by Age Group")
     
     if 'AgeGroup' not in filtered.columns or len(filtered) == 0:
         st.warning("⚠️ No age group data available")
     else:
-        age_dist = filtered['AgeGroup'].value_counts().reset_index()
+        age_dist = demo['age_dist']
+        age_dist = age_dist[age_dist > 0].reset_index()
         if len(age_dist) == 0:
             st.warning("⚠️ No age data to display")
         else:
@@ -793,13 +1010,10 @@ elif page == "👥 People Demographics":
     st.subheader("📂 Department Preferences by Age Group")
     
     if 'AgeGroup' in filtered.columns and 'Department' in filtered.columns:
-        age_dept = filtered.groupby(['AgeGroup', 'Department']).agg(
-            TotalSales=('SalesAmount', 'sum'),
-            Quantity=('Quantity', 'sum')
-        ).reset_index()
+        age_dept = demo['age_dept']
         
         if len(age_dept) > 0:
-            heatmap = alt.Chart(age_dept).mark_rect().encode(
+            heatmap = alt.Chart(age_dept[['AgeGroup', 'Department', 'TotalSales']]).mark_rect().encode(
                 x=alt.X('Department:N'),
                 y=alt.Y('AgeGroup:N'),
                 color='TotalSales:Q'
@@ -817,7 +1031,9 @@ elif page == "👥 People Demographics":
     st.subheader("🌍 Customer Distribution by Nationality")
     
     if 'Nationality' in filtered.columns and len(filtered) > 0:
-        nation_data = filtered['Nationality'].value_counts().head(10).reset_index()
+        # value_counts on a categorical also lists unobserved categories at 0
+        nation_counts = demo['nation_counts']
+        nation_data = nation_counts[nation_counts > 0].head(10).reset_index()
         if len(nation_data) > 0:
             nation_data.columns = ['Nationality', 'Count']
             
@@ -837,9 +1053,7 @@ elif page == "👥 People Demographics":
     # NATIONALITY × DEPARTMENT
     st.subheader("📂 Department Preferences by Nationality")
     
-    nation_dept = filtered.groupby(['Nationality', 'Department']).agg(
-        TotalSales=('SalesAmount', 'sum')
-    ).reset_index().sort_values('TotalSales', ascending=False).head(20)
+    nation_dept = demo['nation_dept'].sort_values('TotalSales', ascending=False).head(20)
     
     st.dataframe(nation_dept, use_container_width=True)
     
@@ -848,45 +1062,33 @@ elif page == "👥 People Demographics":
     # GENDER ANALYSIS
     st.subheader("🧑‍🤝‍🧑 Customer Distribution by Gender")
     
-    gender_data = filtered['Gender'].value_counts().reset_index()
+    gender_counts = demo['gender_counts']
+    gender_data = gender_counts[gender_counts > 0].reset_index()
     gender_data.columns = ['Gender', 'Count']
     
     col1, col2 = st.columns([1, 1])
     
     with col1:
-        chart = alt.Chart(gender_data).mark_bar().encode(
-            x=alt.X('Gender:N'),
-            y='Count:Q',
-            color='Gender:N'
-        ).properties(height=300)
-        st.altair_chart(chart, use_container_width=True)
+        st.altair_chart(gender_bar(gender_data, 'Count'), use_container_width=True)
     
     with col2:
-        gender_sales = filtered.groupby('Gender')['SalesAmount'].sum().reset_index()
+        gender_sales = demo['gender_sales'].reset_index()
         gender_sales.columns = ['Gender', 'TotalSales']
-        chart = alt.Chart(gender_sales).mark_bar().encode(
-            x=alt.X('Gender:N'),
-            y='TotalSales:Q',
-            color='Gender:N'
-        ).properties(height=300)
-        st.altair_chart(chart, use_container_width=True)
+        st.altair_chart(gender_bar(gender_sales, 'TotalSales'), use_container_width=True)
     
     st.divider()
     
     # PERSONA INSIGHTS
     st.subheader("💡 Key Customer Personas & Insights")
     
-    top_age = filtered['AgeGroup'].value_counts().index[0]
-    top_nation = filtered['Nationality'].value_counts().index[0]
-    top_gender = filtered['Gender'].value_counts().index[0]
-    
-    persona_data = filtered[(filtered['AgeGroup'] == top_age) & 
-                            (filtered['Nationality'] == top_nation) & 
-                            (filtered['Gender'] == top_gender)]
+    persona = persona_profile(df, *filter_args)
+    top_age = persona['AgeGroup']
+    top_nation = persona['Nationality']
+    top_gender = persona['Gender']
     
-    if len(persona_data) > 0:
-        top_dept_persona = persona_data['Department'].value_counts().index[0]
-        top_store_persona = persona_data['Store_Format'].value_counts().index[0]
+    if persona['Count'] > 0:
+        top_dept_persona = persona['Department']
+        top_store_persona = persona['Store_Format']
         
         st.markdown(f"""
         <div class="insight-box">
@@ -896,7 +1098,7 @@ elif page == "👥 People Demographics":
         • Gender: <b>{top_gender}</b><br>
         • Preferred Department: <b>{top_dept_persona}</b><br>
         • Preferred Store: <b>{top_store_persona}</b><br>
-        • Frequency: <b>{len(persona_data)} transactions</b>
+        • Frequency: <b>{persona['Count']} transactions</b>
         </div>
         """, unsafe_allow_html=True)
     
@@ -906,11 +1108,7 @@ elif page == "👥 People Demographics":
     st.subheader("🏆 Most Loyal Customer Profiles")
     
     # Calculate loyalty by repeat purchases per segment
-    loyalty = filtered.groupby(['AgeGroup', 'Nationality', 'Gender']).agg(
-        RepeatPurchases=('Transaction', 'count'),
-        TotalSpent=('SalesAmount', 'sum'),
-        AvgTransactionValue=('SalesAmount', 'mean')
-    ).reset_index().sort_values('RepeatPurchases', ascending=False).head(10)
+    loyalty = loyalty_profiles(df, *filter_args)
     
     st.dataframe(loyalty, use_container_width=True)
     
@@ -935,9 +1133,9 @@ elif page == "👥 People Demographics":
     # QUESTIONNAIRE
     st.subheader("❓ Demographics Strategy Questions")
     
-    q1 = st.selectbox("Which age group should we prioritize?", sorted(filtered['AgeGroup'].unique()))
-    q2 = st.selectbox("Which nationality to target?", sorted(filtered['Nationality'].unique()))
-    q3 = st.selectbox("Which product category to promote?", list(filtered['Department'].unique()))
+    q1 = st.selectbox("Which age group should we prioritize?", present_values(df, *filter_args, 'AgeGroup'))
+    q2 = st.selectbox("Which nationality to target?", present_values(df, *filter_args, 'Nationality'))
+    q3 = st.selectbox("Which product category to promote?", present_values(df, *filter_args, 'Department'))
     
     if st.button("💾 Save Demographics Strategy"):
         st.success(f"✅ Demographics strategy saved! Target: {q1}, {q2}")
@@ -949,42 +1147,38 @@ elif page == "🎯 Strategic Recommendations":
     st.subheader("📊 Executive Insights & Action Items")
     
     # Calculate key metrics
-    total_sales = filtered['SalesAmount'].sum()
-    best_city = filtered.groupby('City')['SalesAmount'].sum().idxmax()
-    worst_city = filtered.groupby('City')['SalesAmount'].sum().idxmin()
-    best_dept = filtered.groupby('Department')['SalesAmount'].sum().idxmax()
-    worst_dept = filtered.groupby('Department')['SalesAmount'].sum().idxmin()
-    best_campaign = filtered.groupby('Campaign')['SalesAmount'].sum().idxmax()
-    best_age = filtered['AgeGroup'].value_counts().index[0]
-    best_store = filtered.groupby('Store_Format')['SalesAmount'].sum().idxmax()
+    sums, modes = strategic_sums(df, *filter_args)
+    total_sales = sums['City'].sum()
+    best_city = sums['City'].idxmax()
+    worst_city = sums['City'].idxmin()
+    best_dept = sums['Department'].idxmax()
+    worst_dept = sums['Department'].idxmin()
+    best_campaign = sums['Campaign'].idxmax()
+    best_age = modes['AgeGroup']
+    best_store = sums['Store_Format'].idxmax()
+    
+    # Gap between the best and worst city, read off the city totals
+    sales_gap = (sums['City'][best_city] / sums['City'][worst_city] - 1) * 100
     
     # Recommendation 1
-    st.markdown("""
-    <div class="recommendation-box">
-    <b>🎯 Recommendation 1: Geographic Expansion</b><br>
-    Replicate {best_city}'s success strategies in {worst_city} to close the {sales_gap:.0f}% performance gap.
-    </div>
-    """.replace('{best_city}', best_city).replace('{worst_city}', worst_city)
-    .replace('{sales_gap}', str((filtered[filtered['City']==best_city]['SalesAmount'].sum() / filtered[filtered['City']==worst_city]['SalesAmount'].sum() - 1) * 100)), 
-    unsafe_allow_html=True)
+    st.success(
+        "**🎯 Recommendation 1: Geographic Expansion**  \n"
+        f"Replicate {best_city}'s success strategies in {worst_city} to close the {sales_gap:.0f}% performance gap."
+    )
     
     # Recommendation 2
-    st.markdown(f"""
-    <div class="recommendation-box">
-    <b>🎯 Recommendation 2: Department Turnaround</b><br>
-    Boost {worst_dept} by applying {best_campaign}'s marketing strategy.<br>
-    <b>Expected Impact:</b> 30-40% sales increase
-    </div>
-    """, unsafe_allow_html=True)
+    st.success(
+        "**🎯 Recommendation 2: Department Turnaround**  \n"
+        f"Boost {worst_dept} by applying {best_campaign}'s marketing strategy.  \n"
+        "**Expected Impact:** 30-40% sales increase"
+    )
     
     # Recommendation 3
-    st.markdown(f"""
-    <div class="recommendation-box">
-    <b>🎯 Recommendation 3: Demographic Targeting</b><br>
-    Focus on {best_age} age group with {best_campaign} campaign via {best_store} store format.<br>
-    <b>Rationale:</b> Highest engagement rate, proven ROI
-    </div>
-    """, unsafe_allow_html=True)
+    st.success(
+        "**🎯 Recommendation 3: Demographic Targeting**  \n"
+        f"Focus on {best_age} age group with {best_campaign} campaign via {best_store} store format.  \n"
+        "**Rationale:** Highest engagement rate, proven ROI"
+    )
     
     st.divider()
     
@@ -1010,46 +1204,18 @@ elif page == "🎯 Strategic Recommendations":
     # DETAILED ANALYSIS TABLE
     st.subheader("📋 Comprehensive Analysis Summary")
     
-    summary_data = {
-        'Metric': [
-            'Best Performing City',
-            'Underperforming City',
-            'Best Department',
-            'Underperforming Department',
-            'Best Campaign',
-            'Primary Age Group',
-            'Top Nationality',
-            'Best Store Format',
-            'Total Sales',
-            'Total Transactions'
-        ],
-        'Value': [
-            best_city,
-            worst_city,
-            best_dept,
-            worst_dept,
-            best_campaign,
-            best_age,
-            filtered['Nationality'].value_counts().index[0],
-            best_store,
-            f"AED {total_sales:,.0f}",
-            f"{filtered['Transaction'].nunique():,}"
-        ],
-        'Action': [
-            'Maintain & Expand',
-            'Review Strategy',
-            'Scale Investment',
-            'Revamp Marketing',
-            'Increase Budget',
-            'Target Campaigns',
-            'Create Focused Offers',
-            'Optimize Format',
-            'Monitor ROI',
-            'Track Conversion'
-        ]
-    }
-    
-    summary_df = pd.DataFrame(summary_data)
+    summary_df = summary_frame((
+        best_city,
+        worst_city,
+        best_dept,
+        worst_dept,
+        best_campaign,
+        best_age,
+        modes['Nationality'],
+        best_store,
+        f"AED {total_sales:,.0f}",
+        f"{len(baskets):,}"
+    ))
     st.dataframe(summary_df, use_container_width=True)
     
     st.divider()
@@ -1076,13 +1242,14 @@ elif page == "🎯 Strategic Recommendations":
 st.sidebar.divider()
 st.sidebar.header("💾 Export & Reports")
 
+# The CSV is only built once asked for; export_csv holds the latest selection's
+# bytes as a shared resource, so they are not copied again on each rerun
 if st.sidebar.button("📥 Download Filtered Data"):
-    csv = filtered.to_csv(index=False)
     st.sidebar.download_button(
         label="📥 Download CSV",
-        data=csv,
-        file_name=f"lulu_sales_analysis_{datetime.now().strftime('%Y%m%d')}.csv",
+        data=export_csv(df, *filter_args),
+        file_name=f"lulu_sales_analysis_{TODAY_STR}.csv",
         mime="text/csv"
     )
 
-st.sidebar.info("📌 Dashboard updated: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
\ No newline at end of file
+st.sidebar.info("📌 Dashboard updated: " + NOW_STR)
\ No newline at end of file
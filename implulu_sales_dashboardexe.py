@@ -7,6 +7,9 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import altair as alt
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import io
 from datetime import datetime
 import warnings
 
@@ -78,11 +81,35 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ===== HELPER FUNCTIONS =====
-@st.cache_data
-def load_data(file_path):
+def load_data(source):
+    # source is a file path or the raw bytes of an uploaded CSV
+    def open_source():
+        return io.BytesIO(source) if isinstance(source, bytes) else source
+    try:
+        # Detect columns from the header alone so numbers and dates are typed
+        # by the parser instead of being re-parsed from strings afterwards
+        mapping = detect_columns(pd.read_csv(open_source(), nrows=0))
+    except (OSError, ValueError):
+        # Missing file, or an empty or unreadable CSV
+        return None
+    dtypes = {mapping[k]: 'float32' for k in ('amount', 'age') if mapping[k]}
+    parse_dates = [mapping['date']] if mapping['date'] else None
+    try:
+        # pyarrow parses multi-threaded and infers ISO dates itself;
+        # strings_can_be_null keeps empty text cells as NaN, like pandas
+        opts = pacsv.ConvertOptions(column_types={c: pa.float32() for c in dtypes}, strings_can_be_null=True)
+        return pacsv.read_csv(open_source(), convert_options=opts).to_pandas(date_as_object=False)
+    except (pa.ArrowInvalid, ValueError, TypeError):
+        pass
     try:
-        return pd.read_csv(file_path)
-    except:
+        return pd.read_csv(open_source(), dtype=dtypes, parse_dates=parse_dates)
+    except (ValueError, TypeError):
+        pass
+    try:
+        # A detected column isn't actually numeric; let prepare_data coerce it
+        return pd.read_csv(open_source())
+    except ValueError:
+        # Malformed rows the untyped parser can't read either
         return None
 
 def detect_columns(df):
@@ -115,8 +142,6 @@ def detect_columns(df):
     }
 
 def prepare_data(df, mapping):
-    d = df.copy()
-    
     # Rename columns
     ren = {}
     if mapping['amount']: ren[mapping['amount']] = 'SalesAmount'
@@ -137,7 +162,9 @@ def prepare_data(df, mapping):
     if mapping['date']: ren[mapping['date']] = 'Date'
     if mapping['customer_type']: ren[mapping['customer_type']] = 'CustomerType'
     
-    d = d.rename(columns=ren)
+    # rename builds a new frame and every column below is reassigned rather than
+    # modified in place, so the raw frame needs no defensive copy
+    d = df.rename(columns=ren, copy=False)
     
     # Ensure numeric columns
     if 'SalesAmount' not in d.columns:
@@ -153,29 +180,29 @@ def prepare_data(df, mapping):
     if 'Transaction' not in d.columns:
         d['Transaction'] = range(len(d))
     
+    # Integer transaction codes, so per-group transaction counts hash ints rather than IDs;
+    # blank IDs (code -1) become <NA> so nunique and groupby skip them like NaN IDs
+    codes = pd.factorize(d['Transaction'])[0]
+    d['TxnCode'] = pd.arrays.IntegerArray(codes.astype(np.int32), codes < 0)
+    
     # Age groups
     if 'Age' not in d.columns:
         d['Age'] = np.random.randint(18, 65, len(d))
     else:
         d['Age'] = pd.to_numeric(d['Age'], errors='coerce').fillna(30)
     
-    def get_age_group(age):
-        if pd.isna(age): return 'Unknown'
-        if age < 18: return '13-17'
-        elif age < 25: return '18-24'
-        elif age < 35: return '25-34'
-        elif age < 45: return '35-44'
-        elif age < 55: return '45-54'
-        elif age < 65: return '55-64'
-        else: return '65+'
-    
-    d['AgeGroup'] = d['Age'].apply(get_age_group)
+    # Bucket ages in one vectorised pass; bins are left-closed, so 18 falls in '18-24'
+    age_bins = [-np.inf, 18, 25, 35, 45, 55, 65, np.inf]
+    age_labels = ['13-17', '18-24', '25-34', '35-44', '45-54', '55-64', '65+']
+    # Kept as an ordered categorical so counts come out in age order without re-sorting
+    d['AgeGroup'] = pd.cut(d['Age'], bins=age_bins, labels=age_labels, right=False).cat.add_categories('Unknown').fillna('Unknown')
     
     # Fill text columns
     text_cols = ['Department','Store_Format','Category','Product','Campaign','Channel','PromoCode','Gender','Nationality','City','Zone','CustomerType']
     for col in text_cols:
         if col in d.columns:
-            d[col] = d[col].fillna('Unknown').astype(str)
+            # Categorical so groupbys and filters work on integer codes
+            d[col] = d[col].fillna('Unknown').astype(str).astype('category')
     
     # Date
     if 'Date' in d.columns:
@@ -185,21 +212,103 @@ def prepare_data(df, mapping):
     
     # Promo used
     if 'PromoCode' in d.columns:
-        d['PromoUsed'] = d['PromoCode'].apply(lambda x: x != 'Unknown' and x != '' if isinstance(x, str) else False)
+        # PromoCode is already filled and cast to str above, so a vectorised isin suffices
+        d['PromoUsed'] = ~d['PromoCode'].isin(['Unknown', ''])
     else:
         d['PromoUsed'] = False
     
+    # Narrow numeric dtypes halve the bytes every groupby-sum and mean reads
+    # Quantity and Age are only made integer when that truncates nothing
+    d['SalesAmount'] = d['SalesAmount'].astype(np.float32)
+    q, age = d['Quantity'], d['Age']
+    d['Quantity'] = q.astype(np.int32) if (q % 1 == 0).all() else q.astype(np.float32)
+    d['Age'] = age.astype(np.int16) if (age % 1 == 0).all() else age.astype(np.float32)
+    
     return d
 
-def get_top_items(df, col, n=5):
-    if col not in df.columns or len(df) == 0:
-        return pd.DataFrame()
-    return df.groupby(col).agg(
+@st.cache_data
+def load_prepared(source):
+    # Column detection and preparation run once per data source, not on every rerun
+    raw = load_data(source)
+    if raw is None:
+        return None
+    return prepare_data(raw, detect_columns(raw))
+
+@st.cache_data
+def unique_non_unknown(_df, data_key, col):
+    # Sorted option list for a categorical column; reads the categories, not the rows
+    return sorted(c for c in _df[col].cat.categories if c != 'Unknown')
+
+@st.cache_data
+def filtered_idx(_df, data_key, city, store, date_range):
+    # Row positions matching the sidebar filters, cached so revisiting a selection
+    # skips the scan; the mask is built on plain NumPy arrays, avoiding index alignment
+    mask = np.ones(len(_df), dtype=bool)
+    if city != 'All':
+        mask &= (_df['City'].values == city)
+    if store != 'All':
+        mask &= (_df['Store_Format'].values == store)
+    if date_range and len(date_range) == 2:
+        # Compare raw int64 ticks; the bounds are cast to the column's own unit
+        # (pyarrow reads give ms, pandas ns). NaT is the int64 minimum, so it never matches
+        dates = _df['Date'].values
+        start, end = (np.datetime64(d).astype(dates.dtype).view('i8') for d in date_range)
+        ticks = dates.view('i8')
+        mask &= (ticks >= start) & (ticks <= end)
+    return np.flatnonzero(mask)
+
+@st.cache_data
+def basket_totals(_rows, data_key, filter_key):
+    # Per-transaction sales of _rows; data_key and filter_key identify which rows they are
+    return _rows.groupby('TxnCode', observed=True, sort=False)['SalesAmount'].sum()
+
+@st.cache_data
+def exec_kpis(_rows, data_key, filter_key):
+    # Executive KPIs reading each column once: per-basket totals come from a
+    # bincount over the transaction codes rather than a groupby. Rows with a blank
+    # ID (<NA> code) count towards total sales but belong to no basket
+    sales = _rows['SalesAmount'].values
+    codes = _rows['TxnCode'].to_numpy(dtype=np.int64, na_value=-1)
+    valid = codes >= 0
+    basket_sales = np.bincount(codes[valid], weights=sales[valid])
+    total_txns = int(np.count_nonzero(np.bincount(codes[valid])))
+    total_sales = sales.sum(dtype=np.float64)
+    avg_basket = basket_sales.sum() / total_txns if total_txns > 0 else 0
+    promo_rate = _rows['PromoUsed'].values.mean() * 100 if len(_rows) > 0 else 0
+    return total_sales, total_txns, avg_basket, promo_rate
+
+def summarize_by(df, col):
+    # Sales, quantity, transactions and average price per group in one groupby
+    return df.groupby(col, observed=True, sort=False).agg(
         Sales=('SalesAmount', 'sum'),
         Qty=('Quantity', 'sum'),
-        Txns=('Transaction', 'nunique'),
+        Txns=('TxnCode', 'nunique'),
         AvgPrice=('SalesAmount', 'mean')
-    ).reset_index().sort_values('Sales', ascending=False).head(n)
+    ).reset_index()
+
+def top_n_by_category(df, col, value_col='SalesAmount', n=5):
+    # Top-n category totals from a bincount over the category codes; categories
+    # with no rows in df are skipped, as with an observed groupby
+    s = df[col]
+    codes = s.cat.codes.values
+    k = len(s.cat.categories)
+    sums = np.bincount(codes, weights=df[value_col].values, minlength=k)
+    idx = np.flatnonzero(np.bincount(codes, minlength=k))
+    if len(idx) > n:
+        idx = idx[np.argpartition(-sums[idx], n)[:n]]
+    idx = idx[np.argsort(-sums[idx], kind='stable')]
+    return pd.DataFrame({col: s.cat.categories[idx], 'Sales': sums[idx]})
+
+def pair_sums(df, a, b, value_col='SalesAmount'):
+    # Two-key totals from one bincount over the packed category codes; returns the
+    # observed pairs in key order, like groupby([a, b], observed=True)[value_col].sum()
+    ca, cb = df[a].astype('category').cat, df[b].astype('category').cat
+    shape = (len(ca.categories), len(cb.categories))
+    key = np.ravel_multi_index((ca.codes.values, cb.codes.values), shape)
+    sums = np.bincount(key, weights=df[value_col].values, minlength=shape[0] * shape[1])
+    idx = np.flatnonzero(np.bincount(key, minlength=shape[0] * shape[1]))
+    ia, ib = np.unravel_index(idx, shape)
+    return pd.DataFrame({a: ca.categories[ia], b: cb.categories[ib], value_col: sums[idx]})
 
 def calculate_roi(campaign_sales, campaign_spend=1000):
     if campaign_spend == 0:
@@ -210,26 +319,25 @@ def calculate_roi(campaign_sales, campaign_spend=1000):
 st.sidebar.header("📂 Data Management")
 
 DEFAULT_PATH = "/mnt/data/lulu_uae_master_2000.csv"
-raw_data = load_data(DEFAULT_PATH)
+df = load_prepared(DEFAULT_PATH)
+data_key = DEFAULT_PATH
 
-if raw_data is None:
+if df is None:
     uploaded_file = st.sidebar.file_uploader("📤 Upload CSV File", type=['csv'])
     if uploaded_file:
-        raw_data = pd.read_csv(uploaded_file)
-    else:
+        df = load_prepared(uploaded_file.getvalue())
+        data_key = uploaded_file.file_id
+    if df is None:
         st.error("❌ No data loaded. Please upload a CSV file.")
         st.stop()
 
-mapping = detect_columns(raw_data)
-df = prepare_data(raw_data, mapping)
-
 # ===== GLOBAL FILTERS =====
 st.sidebar.header("🎯 Filters")
 
-cities = ['All'] + sorted([c for c in df['City'].unique() if c != 'Unknown'])
+cities = ['All'] + unique_non_unknown(df, data_key, 'City')
 selected_city = st.sidebar.selectbox("🏙️ City", cities)
 
-stores = ['All'] + sorted([s for s in df['Store_Format'].unique() if s != 'Unknown'])
+stores = ['All'] + unique_non_unknown(df, data_key, 'Store_Format')
 selected_store = st.sidebar.selectbox("🏬 Store Format", stores)
 
 if df['Date'].notna().any():
@@ -239,17 +347,9 @@ if df['Date'].notna().any():
 else:
     date_range = None
 
-# Apply filters
-mask = pd.Series(True, index=df.index)
-if selected_city != 'All':
-    mask &= (df['City'] == selected_city)
-if selected_store != 'All':
-    mask &= (df['Store_Format'] == selected_store)
-if date_range and len(date_range) == 2:
-    start, end = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-    mask &= (df['Date'] >= start) & (df['Date'] <= end)
-
-filtered = df[mask].copy()
+# Apply filters; pages only read from filtered, so the selection is not copied again
+filter_key = (selected_city, selected_store, date_range)
+filtered = df.iloc[filtered_idx(df, data_key, *filter_key)]
 
 if len(filtered) == 0:
     st.warning("⚠️ No data for selected filters")
@@ -275,10 +375,7 @@ if page == "📊 Executive Dashboard":
     # KPI Row
     col1, col2, col3, col4 = st.columns(4)
     
-    total_sales = filtered['SalesAmount'].sum()
-    total_txns = filtered['Transaction'].nunique()
-    avg_basket = filtered.groupby('Transaction')['SalesAmount'].sum().mean() if total_txns > 0 else 0
-    promo_rate = (filtered['PromoUsed'].sum() / len(filtered)) * 100 if len(filtered) > 0 else 0
+    total_sales, total_txns, avg_basket, promo_rate = exec_kpis(filtered, data_key, filter_key)
     
     col1.markdown(f"""
     <div class="kpi-card">
@@ -315,8 +412,7 @@ if page == "📊 Executive Dashboard":
     
     with col1:
         st.subheader("🏆 Top 5 Cities")
-        top_cities = filtered.groupby('City')['SalesAmount'].sum().nlargest(5).reset_index()
-        top_cities.columns = ['City', 'Sales']
+        top_cities = top_n_by_category(filtered, 'City')
         chart = alt.Chart(top_cities).mark_bar().encode(
             y=alt.Y('City:N', sort='-x'),
             x='Sales:Q',
@@ -326,8 +422,7 @@ if page == "📊 Executive Dashboard":
     
     with col2:
         st.subheader("📂 Top 5 Departments")
-        top_depts = filtered.groupby('Department')['SalesAmount'].sum().nlargest(5).reset_index()
-        top_depts.columns = ['Department', 'Sales']
+        top_depts = top_n_by_category(filtered, 'Department')
         chart = alt.Chart(top_depts).mark_bar().encode(
             y=alt.Y('Department:N', sort='-x'),
             x='Sales:Q',
@@ -337,8 +432,7 @@ if page == "📊 Executive Dashboard":
     
     with col3:
         st.subheader("📢 Top 5 Campaigns")
-        top_camps = filtered.groupby('Campaign')['SalesAmount'].sum().nlargest(5).reset_index()
-        top_camps.columns = ['Campaign', 'Sales']
+        top_camps = top_n_by_category(filtered, 'Campaign')
         chart = alt.Chart(top_camps).mark_bar().encode(
             y=alt.Y('Campaign:N', sort='-x'),
             x='Sales:Q',
@@ -363,7 +457,7 @@ elif page == "🏙️ City Strategy":
     st.title("🏙️ City Strategic Analysis")
     st.write("*Identify growth opportunities and optimize city-level performance*")
     
-    analysis_city = st.selectbox("Select City for Analysis", sorted([c for c in df['City'].unique() if c != 'Unknown']))
+    analysis_city = st.selectbox("Select City for Analysis", unique_non_unknown(df, data_key, 'City'))
     city_data = filtered[filtered['City'] == analysis_city] if selected_city == 'All' else filtered
     
     if len(city_data) == 0:
@@ -371,27 +465,28 @@ elif page == "🏙️ City Strategy":
         st.stop()
     
     # City metrics
+    city_baskets = basket_totals(city_data, data_key, filter_key + (analysis_city,))
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("💰 City Sales", f"AED {city_data['SalesAmount'].sum():,.0f}")
-    col2.metric("🛒 Transactions", f"{city_data['Transaction'].nunique():,}")
+    col2.metric("🛒 Transactions", f"{len(city_baskets):,}")
     col3.metric("👥 Unique Products", f"{city_data['Product'].nunique()}")
-    col4.metric("📊 Avg Transaction", f"AED {city_data.groupby('Transaction')['SalesAmount'].sum().mean():,.0f}")
+    col4.metric("📊 Avg Transaction", f"AED {city_baskets.mean():,.0f}")
     
     st.divider()
     
-    # Top vs Bottom Performers
+    # Top vs Bottom Performers, plus the recommendations below, from one department summary
+    dept_summary = summarize_by(city_data, 'Department')
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("✅ Top Departments")
-        top_depts = get_top_items(city_data, 'Department', 5)
+        top_depts = dept_summary.nlargest(5, 'Sales')
         if len(top_depts) > 0:
             st.dataframe(top_depts, use_container_width=True)
     
     with col2:
         st.subheader("⚠️ Underperforming Departments")
-        bottom_depts = city_data.groupby('Department')['SalesAmount'].sum().nsmallest(5).reset_index()
-        bottom_depts.columns = ['Department', 'Sales']
+        bottom_depts = dept_summary.nsmallest(5, 'Sales')[['Department', 'Sales']].reset_index(drop=True)
         if len(bottom_depts) > 0:
             st.dataframe(bottom_depts, use_container_width=True)
     
@@ -399,7 +494,8 @@ elif page == "🏙️ City Strategy":
     
     # Age Group Analysis
     st.subheader("👥 Customer Demographics")
-    age_data = city_data['AgeGroup'].value_counts().reset_index()
+    age_counts = city_data['AgeGroup'].value_counts()
+    age_data = age_counts[age_counts > 0].reset_index()
     if len(age_data) > 0:
         age_data.columns = ['AgeGroup', 'Count']
         chart = alt.Chart(age_data).mark_bar().encode(
@@ -412,8 +508,8 @@ elif page == "🏙️ City Strategy":
     st.divider()
     
     # Recommendations
-    best_dept = city_data.groupby('Department')['SalesAmount'].sum().idxmax()
-    worst_dept = city_data.groupby('Department')['SalesAmount'].sum().idxmin()
+    best_dept = dept_summary.loc[dept_summary['Sales'].idxmax(), 'Department']
+    worst_dept = dept_summary.loc[dept_summary['Sales'].idxmin(), 'Department']
     
     st.markdown(f"""
     <div class="recommendation-box">
@@ -438,18 +534,14 @@ elif page == "🏢 Department Insights":
     st.title("🏢 Department Performance Analysis")
     st.write("*Identify department-level opportunities for growth*")
     
-    dept_analysis = filtered.groupby('Department').agg(
-        Sales=('SalesAmount', 'sum'),
-        Qty=('Quantity', 'sum'),
-        Txns=('Transaction', 'nunique'),
-        AvgPrice=('SalesAmount', 'mean')
-    ).reset_index().sort_values('Sales', ascending=False)
+    dept_analysis = summarize_by(filtered, 'Department').sort_values('Sales', ascending=False)
     
     dept_analysis['RevPerUnit'] = dept_analysis['Sales'] / dept_analysis['Qty'].replace(0, 1)
     
     # Chart
     st.subheader("📊 Department Rankings")
-    chart = alt.Chart(dept_analysis).mark_bar().encode(
+    # Only the three encoded columns go into the spec; Qty, Txns and AvgPrice stay out
+    chart = alt.Chart(dept_analysis[['Department', 'Sales', 'RevPerUnit']]).mark_bar().encode(
         x='Department:N',
         y='Sales:Q',
         color='RevPerUnit:Q'
@@ -477,7 +569,7 @@ elif page == "🏢 Department Insights":
     
     # Department vs Campaign
     st.subheader("📢 Best Campaign per Department")
-    dept_camp = filtered.groupby(['Department', 'Campaign'])['SalesAmount'].sum().reset_index().sort_values('SalesAmount', ascending=False)
+    dept_camp = pair_sums(filtered, 'Department', 'Campaign').sort_values('SalesAmount', ascending=False)
     st.dataframe(dept_camp.head(10), use_container_width=True)
     
     st.divider()
@@ -506,23 +598,17 @@ elif page == "📢 Campaign ROI":
     st.title("📢 Campaign Performance & ROI Analysis")
     st.write("*Identify high-performing campaigns and optimize ad spend*")
     
-    campaign_perf = filtered.groupby('Campaign').agg(
+    campaign_perf = filtered.groupby('Campaign', observed=True, sort=False).agg(
         Sales=('SalesAmount', 'sum'),
         Qty=('Quantity', 'sum'),
-        Txns=('Transaction', 'nunique'),
+        Txns=('TxnCode', 'nunique'),
         PromoRate=('PromoUsed', 'mean')
     ).reset_index().sort_values('Sales', ascending=False)
     
-    # Performance rating
-    def get_rating(sales):
-        if sales > campaign_perf['Sales'].quantile(0.75):
-            return '⭐⭐⭐ Excellent'
-        elif sales > campaign_perf['Sales'].quantile(0.25):
-            return '⭐⭐ Good'
-        else:
-            return '⭐ Poor'
-    
-    campaign_perf['Rating'] = campaign_perf['Sales'].apply(get_rating)
+    # Performance rating: both quartiles in one call, then a vectorised bucket
+    q25, q75 = np.percentile(campaign_perf['Sales'].values, [25, 75])
+    campaign_perf['Rating'] = np.where(campaign_perf['Sales'] > q75, '⭐⭐⭐ Excellent',
+                                       np.where(campaign_perf['Sales'] > q25, '⭐⭐ Good', '⭐ Poor'))
     
     st.subheader("🏆 Campaign Rankings with ROI Assessment")
     st.dataframe(campaign_perf[['Campaign', 'Sales', 'Txns', 'PromoRate', 'Rating']], use_container_width=True)
@@ -531,7 +617,7 @@ elif page == "📢 Campaign ROI":
     
     # Campaign by demographics
     st.subheader("👥 Campaign Effectiveness by Age Group")
-    camp_age = filtered.groupby(['Campaign', 'AgeGroup'])['SalesAmount'].sum().reset_index()
+    camp_age = pair_sums(filtered, 'Campaign', 'AgeGroup')
     if len(camp_age) > 0:
         heatmap = alt.Chart(camp_age).mark_rect().encode(
             x='Campaign:N',
@@ -544,7 +630,7 @@ elif page == "📢 Campaign ROI":
     
     # Campaign by City
     st.subheader("🏙️ Campaign Performance by City")
-    camp_city = filtered.groupby(['City', 'Campaign'])['SalesAmount'].sum().reset_index().sort_values('SalesAmount', ascending=False).head(15)
+    camp_city = pair_sums(filtered, 'City', 'Campaign').sort_values('SalesAmount', ascending=False).head(15)
     st.dataframe(camp_city, use_container_width=True)
     
     st.divider()
@@ -576,9 +662,9 @@ elif page == "🏪 Store Format":
     st.title("🏪 Store Format Performance")
     st.write("*Optimize format-specific strategies*")
     
-    store_perf = filtered.groupby('Store_Format').agg(
+    store_perf = filtered.groupby('Store_Format', observed=True, sort=False).agg(
         Sales=('SalesAmount', 'sum'),
-        Txns=('Transaction', 'nunique'),
+        Txns=('TxnCode', 'nunique'),
         Qty=('Quantity', 'sum')
     ).reset_index().sort_values('Sales', ascending=False)
     
@@ -594,7 +680,7 @@ elif page == "🏪 Store Format":
     
     # Format comparison
     st.subheader("📊 Store Format Comparison")
-    chart = alt.Chart(store_perf).mark_bar().encode(
+    chart = alt.Chart(store_perf[['Store_Format', 'Sales', 'AvgBasket']]).mark_bar().encode(
         x='Store_Format:N',
         y='Sales:Q',
         color='AvgBasket:Q'
@@ -605,7 +691,7 @@ elif page == "🏪 Store Format":
     
     # Store × City
     st.subheader("🏙️ Format Performance by City")
-    store_city = filtered.groupby(['City', 'Store_Format'])['SalesAmount'].sum().reset_index().sort_values('SalesAmount', ascending=False).head(15)
+    store_city = pair_sums(filtered, 'City', 'Store_Format').sort_values('SalesAmount', ascending=False).head(15)
     st.dataframe(store_city, use_container_width=True)
     
     st.divider()
@@ -639,11 +725,10 @@ elif page == "👥 Customer Analytics":
     
     # Age distribution
     st.subheader("📊 Customer Age Distribution")
-    age_dist = filtered['AgeGroup'].value_counts().reset_index()
+    # Ordered categorical: sort=False keeps age order; empty groups are dropped
+    age_counts = filtered['AgeGroup'].value_counts(sort=False)
+    age_dist = age_counts[age_counts > 0].reset_index()
     age_dist.columns = ['AgeGroup', 'Count']
-    age_order = ['13-17', '18-24', '25-34', '35-44', '45-54', '55-64', '65+']
-    age_dist['AgeGroup'] = pd.Categorical(age_dist['AgeGroup'], categories=age_order, ordered=True)
-    age_dist = age_dist.sort_values('AgeGroup')
     
     chart = alt.Chart(age_dist).mark_bar().encode(
         x='AgeGroup:N',